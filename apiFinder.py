@@ -1,14 +1,43 @@
 import argparse
+import functools
+import inspect
+import os
+import sys
 import importlib.util
 import importlib
+import multiprocessing
 from pathlib import Path
+from types import ModuleType
 from urllib.parse import urljoin
+from html import unescape
 import warnings
-from concurrent.futures import ThreadPoolExecutor, as_completed
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from contextlib import nullcontext
 import re
-from bs4 import BeautifulSoup
-import requests
-from typing import List, Set, Optional, Dict, Tuple
+try:
+    import re2
+except ImportError:
+    re2 = None
+try:
+    import hyperscan
+except ImportError:
+    hyperscan = None
+try:
+    import brotli
+except ImportError:
+    brotli = None
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+try:
+    import uvloop
+except ImportError:
+    uvloop = None
+import asyncio
+import httpx
+from typing import List, Set, Optional, Dict, Tuple, Iterable, Iterator
 from colorama import init, Fore, Style
 from abc import ABC, abstractmethod
 
@@ -19,11 +48,59 @@ init(autoreset=True)
 warnings.filterwarnings('ignore')
 
 
+def compile_bytes_rule(pattern: str):
+    """
+    将正则编译为 bytes 模式，优先使用线性时间的 RE2（google-re2），未安装时回退到 re
+    RE2 默认按 UTF-8 解释输入，js 中的非 UTF-8 字节会导致匹配失败，因此按 Latin-1 逐字节匹配，与 re 一致
+    :param pattern: 正则
+    :return:
+    """
+    if re2 is None:
+        return re.compile(pattern.encode())
+    options = re2.Options()
+    options.encoding = re2.Options.Encoding.LATIN1
+    return re2.compile(pattern.encode(), options)
+
+
+def compile_hyperscan(patterns: List[str]) -> Optional['hyperscan.Database']:
+    """
+    将多个正则编译为一个 hyperscan 块模式数据库，未安装 hyperscan 时返回 None
+    :param patterns: 正则列表，按下标作为模式 id
+    :return:
+    """
+    if hyperscan is None:
+        return None
+    db = hyperscan.Database()
+    db.compile(expressions=[p.encode() for p in patterns],
+               ids=list(range(len(patterns))),
+               elements=len(patterns),
+               flags=[hyperscan.HS_FLAG_SOM_LEFTMOST] * len(patterns))
+    return db
+
+
 class RequestsInterface(ABC):
     @abstractmethod
     def get(self, url: str, verify_ssl: bool = False) -> Optional[bytes]:
         pass
 
+    def get_stream(self, url: str, verify_ssl: bool = False) -> Iterator[bytes]:
+        """分块下载，默认实现退化为一次 get"""
+        content = self.get(url, verify_ssl)
+        if content:
+            yield content
+
+
+class AsyncRequestsInterface(ABC):
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        pass
+
+    @abstractmethod
+    async def get(self, url: str, verify_ssl: bool = False) -> Optional[bytes]:
+        pass
+
 
 class ParsedInterface(ABC):
     @abstractmethod
@@ -34,13 +111,17 @@ class ParsedInterface(ABC):
     def extract_urls_from_js(self, js: bytes) -> List[str]:
         pass
 
+    def extract_urls_from_chunks(self, chunks: Iterable[bytes]) -> List[str]:
+        """从分块下载的 js 中提取 URL，默认实现拼接后调用 extract_urls_from_js"""
+        return self.extract_urls_from_js(b''.join(chunks))
+
     @abstractmethod
-    def clean(self, paths: Set[str]) -> List[str]:
+    def clean(self, paths: Set[str], sort: bool = True) -> List[str]:
         pass
 
 
 class DefaultRequests(RequestsInterface):
-    """封装 requests，统一超时、headers、错误处理"""
+    """封装 httpx，统一超时、headers、错误处理，同一主机的请求通过 HTTP/2 多路复用"""
     DEFAULT_TIMEOUT = 5
     DEFAULT_HEADERS = {
         "User-Agent": (
@@ -48,14 +129,38 @@ class DefaultRequests(RequestsInterface):
             "AppleWebKit/537.36 (KHTML, like Gecko) "
             "Chrome/90.0.4430.93 Safari/537.36"
         ),
+        # 仅在安装了 brotli 时声明 br，否则 httpx 无法解压
+        "Accept-Encoding": "gzip, deflate, br" if brotli else "gzip, deflate",
     }
+    # 连接池大小：同一主机的多个 js 在各线程间复用连接，应不小于线程数
+    DEFAULT_LIMIT = 64
+    MAX_RETRIES = 2
+    CHUNK_SIZE = 64 * 1024
 
-    def __init__(self, timeout: int = DEFAULT_TIMEOUT, headers: Optional[Dict[str, str]] = None):
+    def __init__(self, timeout: int = DEFAULT_TIMEOUT, headers: Optional[Dict[str, str]] = None,
+                 limit: int = DEFAULT_LIMIT):
         self.timeout = timeout
-        self.session = requests.Session()
-        self.session.headers.update(self.DEFAULT_HEADERS)
+        self.headers = dict(self.DEFAULT_HEADERS)
         if headers:
-            self.session.headers.update(headers)
+            self.headers.update(headers)
+        self.limits = httpx.Limits(max_keepalive_connections=limit, max_connections=limit)
+        # httpx 的证书校验是客户端级别的，按 verify_ssl 分别创建
+        self._clients: Dict[bool, httpx.Client] = {}
+        self._clients_lock = threading.Lock()
+
+    def _client(self, verify_ssl: bool) -> httpx.Client:
+        client = self._clients.get(verify_ssl)
+        if client is None:
+            with self._clients_lock:
+                client = self._clients.get(verify_ssl)
+                if client is None:
+                    transport = httpx.HTTPTransport(verify=verify_ssl, http2=True,
+                                                    limits=self.limits, retries=self.MAX_RETRIES)
+                    # 等待空闲连接的时间不计入超时，与 aiohttp 一样只限制连接与读取
+                    client = httpx.Client(transport=transport, timeout=httpx.Timeout(self.timeout, pool=None),
+                                          headers=self.headers, follow_redirects=True)
+                    self._clients[verify_ssl] = client
+        return client
 
     def get(self, url: str, verify_ssl: bool = False) -> Optional[bytes]:
         """
@@ -65,17 +170,7 @@ class DefaultRequests(RequestsInterface):
         :return:
         """
         try:
-            if not verify_ssl:
-                try:
-                    from requests.packages.urllib3.exceptions import InsecureRequestWarning
-                    from requests.packages.urllib3 import disable_warnings
-                except ImportError:
-                    import urllib3
-                    from urllib3.exceptions import InsecureRequestWarning
-                    disable_warnings = urllib3.disable_warnings
-                disable_warnings(InsecureRequestWarning)
-
-            resp = self.session.get(url, timeout=self.timeout, verify=verify_ssl)
+            resp = self._client(verify_ssl).get(url)
             resp.raise_for_status()
             print(Fore.GREEN + f"[+] 下载成功: {url}")
             return resp.content
@@ -83,29 +178,154 @@ class DefaultRequests(RequestsInterface):
             print(Fore.RED + f"[!] 请求失败: {url} -> {e}")
             return None
 
+    def get_stream(self, url: str, verify_ssl: bool = False) -> Iterator[bytes]:
+        """
+        流式下载js文件，按 CHUNK_SIZE 分块返回，避免大文件整体驻留内存
+        :param url:
+        :param verify_ssl:
+        :return:
+        """
+        try:
+            with self._client(verify_ssl).stream('GET', url) as resp:
+                resp.raise_for_status()
+                yield from resp.iter_bytes(self.CHUNK_SIZE)
+            print(Fore.GREEN + f"[+] 下载成功: {url}")
+        except Exception as e:
+            print(Fore.RED + f"[!] 请求失败: {url} -> {e}")
+
+
+class DefaultAsyncRequests(AsyncRequestsInterface):
+    """封装 aiohttp，在一个事件循环中并发下载，需在 async with 中使用"""
+    DEFAULT_TIMEOUT = DefaultRequests.DEFAULT_TIMEOUT
+    DEFAULT_HEADERS = DefaultRequests.DEFAULT_HEADERS
+    DEFAULT_LIMIT = 100
+
+    def __init__(self, timeout: int = DEFAULT_TIMEOUT, headers: Optional[Dict[str, str]] = None,
+                 limit: int = DEFAULT_LIMIT):
+        self.timeout = timeout
+        self.headers = dict(self.DEFAULT_HEADERS)
+        if headers:
+            self.headers.update(headers)
+        self.limit = limit
+        self.session: Optional['aiohttp.ClientSession'] = None
+
+    async def __aenter__(self):
+        # ClientSession 必须在事件循环内创建
+        # 不设总超时：在连接池队列中等待的时间不应计入单个请求的超时
+        self.session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=self.limit),
+                                             timeout=aiohttp.ClientTimeout(total=None,
+                                                                           sock_connect=self.timeout,
+                                                                           sock_read=self.timeout),
+                                             headers=self.headers)
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        await self.session.close()
+
+    async def get(self, url: str, verify_ssl: bool = False) -> Optional[bytes]:
+        """
+        使用get方法下载html或者js文件代码
+        :param url:
+        :param verify_ssl:
+        :return:
+        """
+        try:
+            # ssl=None 为默认校验，False 跳过校验
+            async with self.session.get(url, ssl=None if verify_ssl else False) as resp:
+                resp.raise_for_status()
+                content = await resp.read()
+            print(Fore.GREEN + f"[+] 下载成功: {url}")
+            return content
+        except Exception as e:
+            print(Fore.RED + f"[!] 请求失败: {url} -> {e}")
+            return None
+
+
+class LongFragment:
+    """
+    分块匹配时超长引号片段的压缩表示，内存占用与片段长度无关，按默认规则的结构压缩，完整匹配结果与整个片段一致：
+    开头由字母、数字与 _-/ 组成的连续段只影响首尾字节以及中间是否出现 /；
+    其后 HEAD_LEN 字节内已包含 .扩展名 与 ? 等分隔符；再往后只需记录是否出现过 | 或路径中不允许的字符
+    """
+    HEAD_LEN = 16
+    RUN_BYTES = b'abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789_-/'
+    # 路径中不允许的字符（| 单独记录）
+    REST_BYTES = (b'>', b'<', b',', b';', b'(', b')')
+
+    def __init__(self):
+        self.run = b''
+        self.in_run = True
+        self.head = b''
+        self.rest = b''
+
+    def feed(self, data: bytes) -> None:
+        if self.in_run:
+            # 删去连续段字符后剩下的第一个字节即连续段的结束位置，translate 比正则字符类搜索快得多
+            others = data.translate(None, self.RUN_BYTES)
+            end = data.find(others[:1]) if others else len(data)
+            run = self.run + data[:end]
+            if len(run) > 4:
+                run = run[:2] + (b'/' if b'/' in run[2:-2] else b'') + run[-2:]
+            self.run = run
+            if not others:
+                return
+            self.in_run = False
+            data = data[end:]
+        if len(self.head) < self.HEAD_LEN:
+            n = self.HEAD_LEN - len(self.head)
+            self.head += data[:n]
+            data = data[n:]
+        # | 在路径与参数部分都不允许，其余字符只在路径中不允许
+        if self.rest != b'|' and data:
+            if b'|' in data:
+                self.rest = b'|'
+            elif not self.rest and any(c in data for c in self.REST_BYTES):
+                self.rest = b','
+
+    def compact(self) -> bytes:
+        return self.run + self.head + self.rest
+
 
 class DefaultParsed(ParsedInterface):
     """解析 HTML 和 JS 中的脚本及 URL"""
-    DEFAULT_RULES = r"""
-	  (?:"|')                               # Start newline delimiter
-	  (
-	    ((?:/|\.\./|\./)                    # Start with /,../,./
-	    [^"'><,;| *()(%%$^/\\\[\]]          # Next character can't be...
-	    [^"'><,;|()]{1,})                   # Rest of the characters can't be
-	    |
-	    ([a-zA-Z0-9_\-/]{1,}/               # Relative endpoint with /
-	    [a-zA-Z0-9_\-/]{1,}                 # Resource name
-	    \.(?:[a-zA-Z]{1,4}|action)          # Rest + extension (length 1-4 or action)
-	    (?:[\?|/][^"|']{0,}|))              # ? mark with parameters
-	    |
-	    ([a-zA-Z0-9_\-]{1,}                 # filename
-	    \.(?:php|asp|aspx|jsp|json|
-	         action|html|js|txt|xml)             # . + extension
-	    (?:\?[^"|']{0,}|))                  # ? mark with parameters
-	  )
-	  (?:"|')                               # End newline delimiter
-	"""
-    RULE = re.compile(DEFAULT_RULES, re.VERBOSE)
+    # RE2 与 hyperscan 都不支持 VERBOSE，规则按片段拼接，注释写在 Python 层
+    QUOTE_RULE = r"""(?:"|')"""                   # Start / end newline delimiter
+    PATH_RULE = (
+        r"""(?:/|\.\./|\./)"""                    # Start with /,../,./
+        r"""[^"'><,;| *()(%%$^/\\\[\]]"""         # Next character can't be...
+        r"""[^"'><,;|()]{1,}"""                   # Rest of the characters can't be
+    )
+    ENDPOINT_RULE = (
+        r"""[a-zA-Z0-9_\-/]{1,}/"""               # Relative endpoint with /
+        r"""[a-zA-Z0-9_\-/]{1,}"""                # Resource name
+        r"""\.(?:[a-zA-Z]{1,4}|action)"""         # Rest + extension (length 1-4 or action)
+        r"""(?:[\?|/][^"|']{0,}|)"""              # ? mark with parameters
+    )
+    FILE_RULE = (
+        r"""[a-zA-Z0-9_\-]{1,}"""                 # filename
+        r"""\.(?:php|asp|aspx|jsp|json|"""
+        r"""action|html|js|txt|xml)"""            # . + extension
+        r"""(?:\?[^"|']{0,}|)"""                  # ? mark with parameters
+    )
+    # 完整规则，仅作说明；实际匹配拆成下面的预过滤与片段匹配，或交给 hyperscan
+    DEFAULT_RULES = (QUOTE_RULE + '((' + PATH_RULE + ')|(' + ENDPOINT_RULE + ')|(' + FILE_RULE + '))'
+                     + QUOTE_RULE)
+    # 预过滤：先切出引号内的候选片段，只对片段做完整匹配（结束引号用前瞻，可作为下一个片段的开始）
+    QUOTED_RULE = re.compile(rb"""["']([^"']{3,})(?=["'])""")
+    # 规则编译为 bytes，直接匹配原始 js，只解码命中的短片段
+    BODY_RULE = compile_bytes_rule('(' + PATH_RULE + ')|(' + ENDPOINT_RULE + ')|(' + FILE_RULE + ')')
+    # 安装了 hyperscan 时，三个分支编译为同一个多模式数据库
+    HS_DB = compile_hyperscan([
+        QUOTE_RULE + '(?:' + PATH_RULE + ')' + QUOTE_RULE,
+        QUOTE_RULE + '(?:' + ENDPOINT_RULE + ')' + QUOTE_RULE,
+        QUOTE_RULE + '(?:' + FILE_RULE + ')' + QUOTE_RULE,
+    ])
+    _hs_local = threading.local()
+    # 分块匹配时单个 URL 的最大长度
+    MAX_URL_LEN = 4096
+    # 只需要 script 标签的 src，一次线性扫描原始 html 即可，无需构建 DOM
+    # src 的值可以是双引号、单引号或不带引号
+    SCRIPT_RULE = re.compile(rb"""<script\b[^>]*?\ssrc\s*=\s*(?:"([^"]*)"|'([^']*)'|([^\s>]+))""", re.IGNORECASE)
 
     def extract_scripts(self, html: bytes) -> List[str]:
         """
@@ -114,8 +334,8 @@ class DefaultParsed(ParsedInterface):
         :return: url列表
         """
         try:
-            soup = BeautifulSoup(html, 'html.parser')
-            scripts = [tag['src'] for tag in soup.find_all('script', src=True)]
+            # 属性值中的实体（如 &amp;）需要还原
+            scripts = [unescape(m.group(m.lastindex).decode('utf-8', errors='ignore')) for m in self.SCRIPT_RULE.finditer(html)]
             print(Fore.CYAN + f"[~] 找到 {len(scripts)} 个 script 标签")
             return scripts
         except Exception as e:
@@ -128,33 +348,209 @@ class DefaultParsed(ParsedInterface):
         :param js:
         :return:
         """
-        try:
-            text = js.decode('utf-8', errors='ignore')
-        except Exception as e:
-            print(Fore.RED + f"[!] JS 解码失败: {e}")
-            return []
-        urls = [m.group(1) for m in self.RULE.finditer(text)]
+        urls = [js[start:end].decode('utf-8', errors='ignore') for start, end in self._spans(js)]
         # print(Fore.CYAN + f"[~] 从 JS 提取到 {len(urls)} 个 URL")
         return urls
 
-    def clean(self, paths: Set[str]) -> List[str]:
-        cleaned = sorted({p.strip() for p in paths if p.strip()}, key=lambda x: x)
+    def extract_urls_from_chunks(self, chunks: Iterable[bytes]) -> List[str]:
+        """
+        分块匹配 js，只保留最后 MAX_URL_LEN 字节作为与下一块拼接的尾部，内存占用与 js 大小无关
+        超过 MAX_URL_LEN 的引号片段（如内联的 base64 图片）以 LongFragment 压缩后判断是否符合规则，
+        符合则连同其结束引号一起丢弃，否则结束引号仍可作为下一个匹配的开始，与整体匹配一致
+        子类重写了 extract_urls_from_js 时退化为拼接后调用它
+        :param chunks:
+        :return:
+        """
+        if type(self).extract_urls_from_js is not DefaultParsed.extract_urls_from_js:
+            return super().extract_urls_from_chunks(chunks)
+        urls: List[str] = []
+        tail = b''
+        # 正在跳过的超长片段，直到其结束引号
+        skip: Optional[LongFragment] = None
+        for chunk in chunks:
+            if skip is not None:
+                # bytes.find 基于 memchr，比正则字符类搜索快得多
+                quote = min((i for i in (chunk.find(b'"'), chunk.find(b"'")) if i >= 0), default=-1)
+                if quote < 0:
+                    skip.feed(chunk)
+                    continue
+                skip.feed(chunk[:quote])
+                # 整个片段符合规则时结束引号已被匹配占用，不能再作为开始引号
+                chunk = chunk[quote + 1:] if self.BODY_RULE.fullmatch(skip.compact()) else chunk[quote:]
+                skip = None
+            buf = tail + chunk
+            # 开始引号在 safe 之前的匹配已完整出现在 buf 中
+            safe = len(buf) - self.MAX_URL_LEN
+            cut = max(safe, 0)
+            closed = -1
+            for start, end in self._spans(buf):
+                if start - 1 >= safe:
+                    break
+                urls.append(buf[start:end].decode('utf-8', errors='ignore'))
+                # 已匹配片段的结束引号不能再作为下一个匹配的开始
+                closed = end
+                cut = max(cut, end + 1)
+            # 最后一个开始引号之后 MAX_URL_LEN 字节内都没有结束引号：超长片段
+            last_quote = max(buf.rfind(b'"'), buf.rfind(b"'"))
+            if closed < last_quote < safe:
+                skip = LongFragment()
+                skip.feed(buf[last_quote + 1:])
+                tail = b''
+            else:
+                tail = buf[cut:]
+        urls += [tail[start:end].decode('utf-8', errors='ignore') for start, end in self._spans(tail)]
+        return urls
+
+    def _spans(self, js: bytes) -> List[Tuple[int, int]]:
+        """
+        返回不含引号的匹配区间，结果与 DEFAULT_RULES 的 finditer 一致
+        :param js:
+        :return: (start, end) 列表
+        """
+        if self.HS_DB is not None:
+            return self._hs_spans(js)
+        spans: List[Tuple[int, int]] = []
+        last_end = 0
+        for m in self.QUOTED_RULE.finditer(js):
+            # 与 DEFAULT_RULES 的 finditer 一致：已匹配片段的结束引号不能再作为开始引号
+            if m.start() >= last_end and self.BODY_RULE.fullmatch(m.group(1)):
+                spans.append((m.start(1), m.end(1)))
+                last_end = m.end() + 1
+        return spans
+
+    def _hs_spans(self, js: bytes) -> List[Tuple[int, int]]:
+        """
+        使用 hyperscan 扫描 js，返回不含引号的匹配区间，结果与 DEFAULT_RULES 的 finditer 一致
+        :param js:
+        :return: (start, end) 列表
+        """
+        # 匹配内容不含引号，同一起点只会有一个终点
+        hits: Dict[int, int] = {}
+
+        def on_match(_id: int, start: int, end: int, _flags: int, _context) -> None:
+            hits[start] = end
+
+        self.HS_DB.scan(js, match_event_handler=on_match, scratch=self._hs_scratch())
+        # 与 finditer 一样取不重叠的匹配：前一个匹配的结束引号不能作为下一个匹配的开始
+        spans: List[Tuple[int, int]] = []
+        last_end = 0
+        for start in sorted(hits):
+            if start >= last_end:
+                last_end = hits[start]
+                spans.append((start + 1, last_end - 1))
+        return spans
+
+    def _hs_scratch(self) -> 'hyperscan.Scratch':
+        """hyperscan 的 scratch 不能跨线程共享，每个线程各持有一份"""
+        scratch = getattr(self._hs_local, 'scratch', None)
+        if scratch is None:
+            scratch = self._hs_local.scratch = hyperscan.Scratch(self.HS_DB)
+        return scratch
+
+    def clean(self, paths: Set[str], sort: bool = True) -> List[str]:
+        stripped = (s for s in (p.strip() for p in paths) if s)
+        # 不排序时按 paths 的迭代顺序去重
+        cleaned = sorted(set(stripped)) if sort else list(dict.fromkeys(stripped))
         print(Fore.BLUE + f"[=] 总计 {len(cleaned)} 个去重后 URL")
         return cleaned
 
 
+class UrlSink:
+    """汇总提取到的 URL；指定输出文件时边提取边去重写入，不再等全部结束后排序"""
+
+    def __init__(self, output: Optional[str] = None):
+        # dict 保留发现顺序
+        self.urls: Dict[str, None] = {}
+        # 不写文件时先平铺追加，close 时统一去重
+        self.found: List[str] = []
+        self.file = open(output, 'a', encoding='utf-8', buffering=1 << 20) if output else None
+        # add 会在线程池的完成回调中并发调用
+        self.lock = threading.Lock()
+
+    def add(self, urls: List[str]) -> None:
+        with self.lock:
+            self._add(urls)
+
+    def _add(self, urls: List[str]) -> None:
+        if self.file is None:
+            self.found.extend(urls)
+            return
+        new: List[str] = []
+        for url in urls:
+            url = url.strip()
+            if url and url not in self.urls:
+                self.urls[url] = None
+                new.append(url)
+        if new:
+            # 每个 js 只写一次
+            self.file.write('\n'.join(new) + '\n')
+
+    def close(self) -> None:
+        if self.file is not None:
+            self.file.close()
+        else:
+            self.urls = dict.fromkeys(self.found)
+            self.found = []
+
+
 # 动态加载自定义类
 
+def custom_module_name(path: str) -> str:
+    """
+    从 .py 文件加载的自定义模块在 sys.modules 中的名称
+    加前缀避免与同名的标准库或第三方模块冲突（如 json.py）
+    :param path: .py 文件路径
+    :return:
+    """
+    return f"_apifinder_custom_{Path(path).stem}"
+
+
+@functools.lru_cache(maxsize=None)
+def load_module_file(path: str, mtime: float) -> ModuleType:
+    """
+    按 (路径, 修改时间) 缓存加载的模块，文件未修改时不再重复编译执行
+    :param path: .py 文件路径
+    :param mtime: 文件修改时间，仅作为缓存键
+    :return:
+    """
+    p = Path(path)
+    name = custom_module_name(path)
+    spec = importlib.util.spec_from_file_location(name, p)
+    module = importlib.util.module_from_spec(spec)
+    # 注册到 sys.modules，自定义解析类才能被 pickle 发送到解析进程
+    sys.modules[name] = module
+    spec.loader.exec_module(module)  # type: ignore
+    return module
+
+
+# 显式指定解析进程的启动方式：进程在线程池的工作线程中按需创建，fork 一个多线程进程并不安全
+PARSE_MP_CONTEXT = multiprocessing.get_context(
+    'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn')
+
+
+def create_parse_pool(processes: int, parsed_cls: type, custom_module: Optional[str]) -> ProcessPoolExecutor:
+    """
+    创建解析进程池
+    自定义解析类来自 .py 文件时，该模块只注册在当前进程中，每个解析进程需要先自行加载，才能反序列化解析类
+    :param processes: 进程数
+    :param parsed_cls: 解析类
+    :param custom_module: -cm 指定的自定义模块
+    :return:
+    """
+    initializer, initargs = None, ()
+    if custom_module and parsed_cls.__module__ == custom_module_name(custom_module):
+        initializer, initargs = load_module_file, (custom_module, os.path.getmtime(custom_module))
+    return ProcessPoolExecutor(max_workers=processes, mp_context=PARSE_MP_CONTEXT,
+                               initializer=initializer, initargs=initargs)
+
+
 def load_custom(path: Optional[str], cls_names: Tuple[str, str]) -> Tuple[type, type]:
     parsed_name, req_name = cls_names
     if not path:
         return DefaultParsed, DefaultRequests
     try:
         if path.endswith('.py'):
-            p = Path(path)
-            spec = importlib.util.spec_from_file_location(p.stem, p)
-            module = importlib.util.module_from_spec(spec)
-            spec.loader.exec_module(module)  # type: ignore
+            module = load_module_file(path, os.path.getmtime(path))
         else:
             module = importlib.import_module(path)
 
@@ -174,23 +570,96 @@ def load_custom(path: Optional[str], cls_names: Tuple[str, str]) -> Tuple[type,
         return DefaultParsed, DefaultRequests
 
 
+# 跨目标共享：同一个 js（如 CDN 上的公共库）只下载一次
+_fetched_urls: Set[str] = set()
+_fetched_lock = threading.Lock()
+
+
+def claim_js_urls(js_urls: Iterable[str]) -> List[str]:
+    """
+    按原顺序去重，并过滤掉已被其他目标领取的 js 地址
+    :param js_urls:
+    :return: 需要下载的 js 地址
+    """
+    with _fetched_lock:
+        new = [u for u in dict.fromkeys(js_urls) if u not in _fetched_urls]
+        _fetched_urls.update(new)
+    return new
+
+
 def process_target(url: str,
                    parsed_inst: ParsedInterface,
                    req_inst: RequestsInterface,
-                   verify_ssl: bool) -> Set[str]:
-    found: Set[str] = set()
+                   verify_ssl: bool,
+                   pool: ThreadPoolExecutor,
+                   sink: UrlSink,
+                   parse_pool: Optional[ProcessPoolExecutor] = None) -> List[Future]:
+    """
+    在线程池中运行：下载目标页面并将其中的 js 下载任务提交到同一个线程池
+    不等待 js 下载完成，避免占满线程池后互相等待；每个 js 完成后由回调写入 sink
+    :return: js 下载任务列表，结果为从 js 中提取的 URL
+    """
+    print(Fore.MAGENTA + f"[+] 开始处理: {url}")
     html = req_inst.get(url, verify_ssl)
     if not html:
-        return found
+        return []
     scripts = parsed_inst.extract_scripts(html)
-    full_js_urls = [urljoin(url, s) for s in scripts]
-    with ThreadPoolExecutor() as pool:
-        futures = {pool.submit(req_inst.get, js_url, verify_ssl): js_url for js_url in full_js_urls}
-        for f in as_completed(futures):
-            js = f.result()
-            if js:
-                found.update(parsed_inst.extract_urls_from_js(js))
-    return found
+    full_js_urls = claim_js_urls(urljoin(url, s) for s in scripts)
+    futures = [pool.submit(fetch_js_urls, js_url, parsed_inst, req_inst, verify_ssl, parse_pool)
+               for js_url in full_js_urls]
+    for f in futures:
+        # 出错的任务不写入 sink，异常由 main 在线程池结束后通过 result() 抛出
+        f.add_done_callback(lambda fut: fut.exception() is None and sink.add(fut.result()))
+    return futures
+
+
+def fetch_js_urls(js_url: str,
+                  parsed_inst: ParsedInterface,
+                  req_inst: RequestsInterface,
+                  verify_ssl: bool,
+                  parse_pool: Optional[ProcessPoolExecutor] = None) -> List[str]:
+    """
+    在线程池中运行：边下载边匹配 js，峰值内存约为 线程数 × 块大小
+    指定 parse_pool 时整体下载，匹配交给解析进程，绕开 GIL 并行执行正则
+    """
+    if parse_pool is None:
+        return parsed_inst.extract_urls_from_chunks(req_inst.get_stream(js_url, verify_ssl))
+    js = req_inst.get(js_url, verify_ssl)
+    if not js:
+        return []
+    return parse_pool.submit(parsed_inst.extract_urls_from_js, js).result()
+
+
+async def process_target_async(url: str,
+                               parsed_inst: ParsedInterface,
+                               req_inst: AsyncRequestsInterface,
+                               verify_ssl: bool,
+                               sink: UrlSink,
+                               parse_pool: Optional[ProcessPoolExecutor] = None) -> None:
+    print(Fore.MAGENTA + f"[+] 开始处理: {url}")
+    html = await req_inst.get(url, verify_ssl)
+    if not html:
+        return
+    scripts = parsed_inst.extract_scripts(html)
+    full_js_urls = claim_js_urls(urljoin(url, s) for s in scripts)
+    for coro in asyncio.as_completed([req_inst.get(js_url, verify_ssl) for js_url in full_js_urls]):
+        js = await coro
+        if not js:
+            continue
+        # 正则匹配不能阻塞事件循环，未指定 parse_pool 时交给默认线程池
+        sink.add(await asyncio.get_running_loop().run_in_executor(parse_pool, parsed_inst.extract_urls_from_js, js))
+
+
+async def run_async(urls: List[str],
+                    parsed_inst: ParsedInterface,
+                    req_inst: AsyncRequestsInterface,
+                    verify_ssl: bool,
+                    sink: UrlSink,
+                    parse_pool: Optional[ProcessPoolExecutor] = None) -> None:
+    """在同一个事件循环中并发处理所有目标"""
+    async with req_inst:
+        await asyncio.gather(*(process_target_async(u, parsed_inst, req_inst, verify_ssl, sink, parse_pool)
+                               for u in urls))
 
 
 def main():
@@ -202,13 +671,20 @@ def main():
     parser.add_argument('-rn', '--request_name', help='自定义请求类名')
     parser.add_argument('-w', '--workers', type=int, default=10, help='线程数')
     parser.add_argument('--ssl', action='store_true', help='启用 SSL 验证')
+    parser.add_argument('-a', '--async', dest='use_async', action='store_true',
+                        help='使用 asyncio + aiohttp 下载（需要安装 aiohttp）')
+    parser.add_argument('-p', '--processes', type=int, nargs='?', const=os.cpu_count(), default=0,
+                        help='解析进程数，不带值时为 CPU 核数；启用后 js 整体下载并在进程池中匹配')
     parser.add_argument('-o', '--output', help='保存结果到文件', required=False)
+    parser.add_argument('--no-sort', action='store_true', help='不排序，按发现顺序输出')
 
     args = parser.parse_args()
     if not args.url and not args.file:
         parser.error('请通过 -u 或 -f 提供 URL')
     if args.custom_module and not (args.parsed_name or args.request_name):
         parser.error('使用了 -cm 参数，则必须指定 -pn 或 -rn')
+    if args.use_async and aiohttp is None:
+        parser.error('使用 --async 需要安装 aiohttp')
     urls: List[str] = []
     if args.file:
         urls += [l.strip() for l in Path(args.file).read_text(encoding='utf-8').splitlines() if l.strip()]
@@ -218,26 +694,54 @@ def main():
         parser.error('请通过 -u 或 -f 提供 URL')
 
     parsed_cls, req_cls = load_custom(args.custom_module, (args.parsed_name, args.request_name))
+    if args.use_async and req_cls is DefaultRequests:
+        req_cls = DefaultAsyncRequests
     parsed_inst = parsed_cls()
-    req_inst = req_cls()
-
-    all_urls: Set[str] = set()
-    for u in urls:
-        print(Fore.MAGENTA + f"[+] 开始处理: {u}")
-        result = process_target(u, parsed_inst, req_inst, args.ssl)
-        all_urls |= result
-
+    if req_cls is DefaultAsyncRequests:
+        req_inst = DefaultAsyncRequests(limit=args.workers)
+    elif req_cls is DefaultRequests:
+        req_inst = DefaultRequests(limit=args.workers)
+    else:
+        req_inst = req_cls()
+
+    # 自定义 clean 可能会过滤结果，只有默认 clean 才能边提取边写入文件
+    stream_output = args.output if type(parsed_inst).clean is DefaultParsed.clean else None
+    sink = UrlSink(stream_output)
+    parse_ctx = create_parse_pool(args.processes, parsed_cls, args.custom_module) if args.processes else nullcontext()
+    with parse_ctx as parse_pool:
+        if isinstance(req_inst, AsyncRequestsInterface):
+            # 自定义请求类继承 AsyncRequestsInterface 时同样走异步流程
+            if uvloop is not None:
+                asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+            asyncio.run(run_async(urls, parsed_inst, req_inst, args.ssl, sink, parse_pool))
+        else:
+            # 所有目标页面与 js 共用一个线程池
+            with ThreadPoolExecutor(max_workers=args.workers) as pool:
+                target_futures = [pool.submit(process_target, u, parsed_inst, req_inst, args.ssl, pool, sink,
+                                              parse_pool)
+                                  for u in urls]
+                # 目标页面处理完后所有 js 任务都已提交；退出 with 时线程池会等待 js 任务及其回调完成
+                js_futures = [jf for f in wait(target_futures).done for jf in f.result()]
+            # 与逐个等待时一样，js 任务中的异常在此抛出
+            for f in js_futures:
+                f.result()
+    sink.close()
+
+    # 边提取边写入时文件中为发现顺序，打印时同样跳过排序
+    # 自定义解析模块的 clean 可能不接受 sort 参数，仅在需要且支持时传入
+    if (stream_output or args.no_sort) and 'sort' in inspect.signature(parsed_inst.clean).parameters:
+        cleaned = parsed_inst.clean(sink.urls.keys(), sort=False)
+    else:
+        cleaned = parsed_inst.clean(sink.urls.keys())
+    if args.output:
+        if not stream_output:
+            with open(args.output, 'a', encoding='utf-8') as file:
+                file.write(''.join(url + '\n' for url in cleaned))
+        print(Fore.BLUE + f"[=] 已写入 {args.output}")
     # 只打印 URL，方便复制
-    cleaned = parsed_inst.clean(all_urls)
     print(Style.BRIGHT + Fore.WHITE + "\n提取到的 URL 列表:")
-    for url in cleaned:
-        print(url)
-    if args.output:
-
-        file = open(args.output, 'a+', encoding='utf-8')
-        for url in cleaned:
-            file.write(url + '\n')
-        file.close()
+    if cleaned:
+        sys.stdout.write('\n'.join(cleaned) + '\n')
 
 
 if __name__ == '__main__':